@@ -6,42 +6,23 @@
 # etl/01_pull_raw.py
 print(">>> BOOT 01_pull_raw.py", flush=True)
 
-import os
-import sys
-import time
-import threading
-import tempfile
 import argparse
-from datetime import date
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
-import faulthandler
-import pandas as pd
-from google.cloud import storage
+import pyarrow as pa
+
+import _common
 
 #################################
 # Debug (opcional): dump se travar
 #################################
-faulthandler.enable()
-
-def dump_later(seconds: int = 60) -> None:
-    time.sleep(seconds)
-    print(f"\n>>> DUMPING STACKS after {seconds}s\n", flush=True)
-    faulthandler.dump_traceback(file=sys.stdout, all_threads=True)
-
 # deixe ligado enquanto estiver backfillando; depois você pode comentar
-threading.Thread(target=dump_later, daemon=True).start()
+_common.enable_hang_dump(60)
 
 #################################
 # SSL (corporate) - precisa vir cedo
 #################################
-CA_PATH = Path(__file__).resolve().parents[1] / "certs" / "combined_ca.pem"
-if CA_PATH.exists():
-    os.environ["REQUESTS_CA_BUNDLE"] = str(CA_PATH)
-    os.environ["SSL_CERT_FILE"] = str(CA_PATH)
-    print(f">>> SSL bundle set: {CA_PATH}", flush=True)
-else:
-    print(f">>> WARNING: combined_ca.pem not found at {CA_PATH}", flush=True)
+_common.setup_ssl()
 
 #################################
 # NBA API headers (GLOBAL)
@@ -67,38 +48,21 @@ from nba_api.stats.endpoints import leaguegamelog, leaguestandingsv3
 #################################
 # GCS helpers
 #################################
-def parse_gs_uri(gs_uri: str) -> tuple[str, str]:
-    if not gs_uri.startswith("gs://"):
-        raise ValueError(f"Invalid GCS URI: {gs_uri}")
-    parts = gs_uri.split("/", 3)  # ["gs:", "", "bucket", "path..."]
-    bucket_name = parts[2]
-    blob_path = parts[3] if len(parts) > 3 else ""
-    return bucket_name, blob_path
-
-
-def upload_file_to_gcs(local_path: str, gs_uri: str) -> None:
-    bucket_name, blob_path = parse_gs_uri(gs_uri)
-    client = storage.Client()
-    bucket = client.bucket(bucket_name)
-    blob = bucket.blob(blob_path)
-    blob.upload_from_filename(local_path)
-    print(f">>> Uploaded: {gs_uri}", flush=True)
-
+def write_parquet_to_gcs(table: pa.Table, gs_uri: str) -> None:
+    bucket_name, blob_path = _common.parse_gs_uri(gs_uri)
+    _common.write_parquet(table, bucket_name, blob_path)
 
-def write_parquet_to_gcs(df: pd.DataFrame, gs_uri: str, local_name: str) -> None:
-    tmp_dir = Path(tempfile.gettempdir())
-    local_path = tmp_dir / local_name
 
-    print(f">>> Writing parquet locally: {local_path}", flush=True)
-    df.to_parquet(local_path, index=False, engine="pyarrow")
-
-    print(f">>> Uploading to GCS: {gs_uri}", flush=True)
-    upload_file_to_gcs(str(local_path), gs_uri)
-
-    try:
-        local_path.unlink()
-    except Exception:
-        pass
+def endpoint_table(endpoint) -> pa.Table:
+    """
+    Build an Arrow table straight from the endpoint JSON (headers + rowSet),
+    skipping the intermediate pandas DataFrame and its dtype-inference pass.
+    """
+    rs = endpoint.get_dict()["resultSets"][0]
+    headers = rs["headers"]
+    rows = rs["rowSet"]
+    arrays = [pa.array([row[i] for row in rows]) for i in range(len(headers))]
+    return pa.Table.from_arrays(arrays, names=headers)
 
 
 #################################
@@ -114,21 +78,32 @@ def main(season: str, asof: str, bucket: str) -> None:
 
     print(f">>> season={season} asof={asof} bucket={bucket}", flush=True)
 
-    # 1) LeagueGameLog
-    print(">>> Fetching LeagueGameLog...", flush=True)
-    lg = leaguegamelog.LeagueGameLog(season=season, timeout=30)
-    df_games = lg.get_data_frames()[0]
-    print(f">>> LeagueGameLog rows={len(df_games)} cols={df_games.shape[1]}", flush=True)
-
-    write_parquet_to_gcs(df_games, raw_games_gcs, f"nba_raw_leaguegamelog_{season}_{asof}.parquet")
-
-    # 2) Standings
-    print(">>> Fetching LeagueStandingsV3...", flush=True)
-    st = leaguestandingsv3.LeagueStandingsV3(timeout=30)
-    df_stand = st.get_data_frames()[0]
-    print(f">>> Standings rows={len(df_stand)} cols={df_stand.shape[1]}", flush=True)
-
-    write_parquet_to_gcs(df_stand, raw_stand_gcs, f"nba_raw_standings_{season}_{asof}.parquet")
+    def fetch_games() -> pa.Table:
+        print(">>> Fetching LeagueGameLog...", flush=True)
+        lg = leaguegamelog.LeagueGameLog(season=season, timeout=30)
+        return endpoint_table(lg)
+
+    def fetch_standings() -> pa.Table:
+        print(">>> Fetching LeagueStandingsV3...", flush=True)
+        st = leaguestandingsv3.LeagueStandingsV3(timeout=30)
+        return endpoint_table(st)
+
+    # The two endpoints are independent network calls; overlap them so the
+    # run takes max(fetch) instead of sum(fetch). Same for the uploads.
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        fut_games = ex.submit(fetch_games)
+        fut_stand = ex.submit(fetch_standings)
+        tbl_games = fut_games.result()
+        tbl_stand = fut_stand.result()
+
+    print(f">>> LeagueGameLog rows={tbl_games.num_rows} cols={tbl_games.num_columns}", flush=True)
+    print(f">>> Standings rows={tbl_stand.num_rows} cols={tbl_stand.num_columns}", flush=True)
+
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        fut_g = ex.submit(write_parquet_to_gcs, tbl_games, raw_games_gcs)
+        fut_s = ex.submit(write_parquet_to_gcs, tbl_stand, raw_stand_gcs)
+        fut_g.result()
+        fut_s.result()
 
     print("\n>>> RAW salvo no GCS:", flush=True)
     print(raw_games_gcs, flush=True)
@@ -1,105 +1,76 @@
 # etl/02_build_gold.py
 print(">>> BOOT 02_build_gold.py", flush=True)
 
-import os
-import sys
-import time
-import threading
-import tempfile
+import json
 import argparse
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
-import faulthandler
 import pandas as pd
-from google.cloud import storage
+import pyarrow as pa
+import pyarrow.compute as pc
+
+import _common
 
 #################################
 # Debug (opcional): dump se travar
 #################################
-faulthandler.enable()
-
-def dump_later(seconds: int = 60) -> None:
-    time.sleep(seconds)
-    print(f"\n>>> DUMPING STACKS after {seconds}s\n", flush=True)
-    faulthandler.dump_traceback(file=sys.stdout, all_threads=True)
-
-threading.Thread(target=dump_later, daemon=True).start()
+_common.enable_hang_dump(60)
 
 #################################
 # SSL (corporate) - precisa vir cedo
 #################################
-CA_PATH = Path(__file__).resolve().parents[1] / "certs" / "combined_ca.pem"
-if CA_PATH.exists():
-    os.environ["REQUESTS_CA_BUNDLE"] = str(CA_PATH)
-    os.environ["SSL_CERT_FILE"] = str(CA_PATH)
-    print(f">>> SSL bundle set: {CA_PATH}", flush=True)
-else:
-    print(f">>> WARNING: combined_ca.pem not found at {CA_PATH}", flush=True)
+_common.setup_ssl()
 
 #################################
-# GCS helpers
+# Config
 #################################
-def parse_gs_uri(gs_uri: str) -> tuple[str, str]:
-    if not gs_uri.startswith("gs://"):
-        raise ValueError(f"Invalid GCS URI: {gs_uri}")
-    parts = gs_uri.split("/", 3)  # ["gs:", "", "bucket", "path..."]
-    bucket_name = parts[2]
-    blob_path = parts[3] if len(parts) > 3 else ""
-    return bucket_name, blob_path
+# Columns the gold build actually consumes from RAW leaguegamelog;
+# everything else is pruned at the parquet scan.
+GAMES_COLS = [
+    "GAME_ID", "TEAM_ID", "TEAM_ABBREVIATION", "TEAM_NAME",
+    "PTS", "AST", "REB", "OREB", "DREB", "STL", "BLK", "TOV", "PF",
+    "FGM", "FGA", "FG3M", "FG3A", "FTM", "FTA",
+]
 
+#################################
+# GCS helpers
+#################################
+def read_parquet_table_from_gcs(gs_uri: str, columns: list[str] | None = None) -> pa.Table:
+    bucket_name, blob_path = _common.parse_gs_uri(gs_uri)
+    return _common.read_parquet_table(bucket_name, blob_path, columns=columns)
 
-def download_gcs_to_local(gs_uri: str, local_path: str) -> None:
-    bucket_name, blob_path = parse_gs_uri(gs_uri)
-    client = storage.Client()
-    bucket = client.bucket(bucket_name)
-    blob = bucket.blob(blob_path)
 
-    Path(local_path).parent.mkdir(parents=True, exist_ok=True)
-    blob.download_to_filename(local_path)
-    print(f">>> Downloaded: {gs_uri} -> {local_path}", flush=True)
+def read_parquet_from_gcs(gs_uri: str, columns: list[str] | None = None) -> pd.DataFrame:
+    return read_parquet_table_from_gcs(gs_uri, columns=columns).to_pandas()
 
 
-def upload_file_to_gcs(local_path: str, gs_uri: str) -> None:
-    bucket_name, blob_path = parse_gs_uri(gs_uri)
-    client = storage.Client()
-    bucket = client.bucket(bucket_name)
-    blob = bucket.blob(blob_path)
+def upload_json_to_gcs(payload: dict, gs_uri: str) -> None:
+    bucket_name, blob_path = _common.parse_gs_uri(gs_uri)
+    blob = _common.get_bucket(bucket_name).blob(blob_path)
 
-    blob.upload_from_filename(local_path)
+    blob.upload_from_string(json.dumps(payload), content_type="application/json")
     print(f">>> Uploaded: {gs_uri}", flush=True)
 
 
-def read_parquet_from_gcs(gs_uri: str, local_name: str) -> pd.DataFrame:
-    tmp_dir = Path(tempfile.gettempdir())
-    local_path = tmp_dir / local_name
-
-    print(f">>> Reading from GCS via local temp: {gs_uri}", flush=True)
-    download_gcs_to_local(gs_uri, str(local_path))
-
-    df = pd.read_parquet(local_path, engine="pyarrow")
-
-    try:
-        local_path.unlink()
-    except Exception:
-        pass
-
-    return df
-
-
-def write_parquet_to_gcs(df: pd.DataFrame, gs_uri: str, local_name: str) -> None:
-    tmp_dir = Path(tempfile.gettempdir())
-    local_path = tmp_dir / local_name
-
-    print(f">>> Writing parquet locally: {local_path}", flush=True)
-    df.to_parquet(local_path, index=False, engine="pyarrow")
-
-    print(f">>> Uploading to GCS: {gs_uri}", flush=True)
-    upload_file_to_gcs(str(local_path), gs_uri)
-
-    try:
-        local_path.unlink()
-    except Exception:
-        pass
+def upload_parquets_to_gcs(frames: dict[str, pd.DataFrame], bucket_name: str, blob_prefix: str) -> None:
+    """
+    Stream each frame's parquet bytes straight into its blob — no local
+    staging files. The writes run on a small pool so the pair overlaps.
+    Dictionary encoding collapses the team label columns; large row
+    groups keep each small file to a single footer entry.
+    """
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        futures = [
+            ex.submit(
+                _common.write_parquet, df, bucket_name, blob_prefix + name,
+                use_dictionary=True,
+                row_group_size=1_000_000,
+                data_page_size=1 << 20,
+            )
+            for name, df in frames.items()
+        ]
+        for fut in futures:
+            fut.result()
 
 
 #################################
@@ -111,50 +82,94 @@ def main(season: str, asof: str, bucket: str) -> None:
     raw_games_gcs = f"gs://{bucket}/raw/season={season}/endpoint=leaguegamelog/asof={asof}/data.parquet"
     raw_stand_gcs = f"gs://{bucket}/raw/season={season}/endpoint=leaguestandingsv3/asof={asof}/data.parquet"
 
-    gold_kpis_gcs = f"gs://{bucket}/gold/season={season}/kpis.parquet"
-    gold_team_totals_gcs = f"gs://{bucket}/gold/season={season}/team_totals.parquet"
-    gold_standings_gcs = f"gs://{bucket}/gold/season={season}/standings.parquet"
-
-    # 1) Read RAW
-    df_games = read_parquet_from_gcs(raw_games_gcs, f"nba_raw_leaguegamelog_{season}_{asof}.parquet")
-    print(f">>> RAW games rows={len(df_games)} cols={df_games.shape[1]}", flush=True)
-
-    df_stand = read_parquet_from_gcs(raw_stand_gcs, f"nba_raw_standings_{season}_{asof}.parquet")
+    # Hive-style asof= partition: each build lands in its own snapshot dir,
+    # so nothing is overwritten and older snapshots stay queryable.
+    gold_prefix = f"gs://{bucket}/gold/season={season}/asof={asof}"
+    gold_kpis_gcs = f"{gold_prefix}/kpis.json"
+    gold_team_totals_gcs = f"{gold_prefix}/team_totals.parquet"
+    gold_standings_gcs = f"{gold_prefix}/standings.parquet"
+
+    # 1) Read RAW — the two blobs are independent, stream them concurrently
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        fut_games = ex.submit(read_parquet_table_from_gcs, raw_games_gcs, GAMES_COLS)
+        fut_stand = ex.submit(read_parquet_from_gcs, raw_stand_gcs)
+        tbl_games = fut_games.result()
+        df_stand = fut_stand.result()
+
+    print(f">>> RAW games rows={tbl_games.num_rows} cols={tbl_games.num_columns}", flush=True)
     print(f">>> RAW standings rows={len(df_stand)} cols={df_stand.shape[1]}", flush=True)
 
-    # 2) Team totals
+    # 2) Team totals — aggregate on the Arrow table (vectorized hash-sum
+    # kernel) and only convert the ~30-row result to pandas.
     numeric_cols = [
         "PTS", "AST", "REB", "OREB", "DREB", "STL", "BLK", "TOV", "PF",
         "FGM", "FGA", "FG3M", "FG3A", "FTM", "FTA"
     ]
-    for c in numeric_cols:
-        if c in df_games.columns:
-            df_games[c] = pd.to_numeric(df_games[c], errors="coerce")
-
-    group_keys = [c for c in ["TEAM_ID", "TEAM_ABBREVIATION", "TEAM_NAME"] if c in df_games.columns]
-    agg_map = {c: "sum" for c in numeric_cols if c in df_games.columns}
+    present = [c for c in numeric_cols if c in tbl_games.column_names]
+
+    # the sum kernel needs numeric inputs; narrow the stat columns to
+    # 32 bits while we're at it — box-score counts fit comfortably, and
+    # the memory-bound groupby pass moves half the bytes
+    for c in present:
+        field_type = tbl_games.schema.field(c).type
+        if pa.types.is_integer(field_type):
+            target = pa.int32()
+        else:
+            target = pa.float32()
+        if field_type == target:
+            continue
+        i = tbl_games.schema.get_field_index(c)
+        tbl_games = tbl_games.set_column(i, c, pc.cast(tbl_games[c], target))
+
+    group_keys = [c for c in ["TEAM_ID", "TEAM_ABBREVIATION", "TEAM_NAME"] if c in tbl_games.column_names]
+
+    agg = tbl_games.group_by(group_keys).aggregate([(c, "sum") for c in present])
+    agg = agg.rename_columns([n[:-4] if n.endswith("_sum") else n for n in agg.column_names])
+    df_team_totals = agg.to_pandas()[group_keys + present]
+
+    # Downcast before writing: season totals fit well inside 32 bits and the
+    # team labels dictionary-encode; halves bytes on wire and in the app.
+    for c in present:
+        df_team_totals[c] = pd.to_numeric(df_team_totals[c], downcast="integer")
+    for c in ("TEAM_ABBREVIATION", "TEAM_NAME"):
+        if c in df_team_totals.columns:
+            df_team_totals[c] = df_team_totals[c].astype("category")
 
-    df_team_totals = df_games.groupby(group_keys, as_index=False).agg(agg_map)
     df_team_totals["ASOF"] = asof
     df_team_totals["SEASON"] = season
 
-    # 3) KPIs da liga
-    kpi_fields = [c for c in ["PTS", "AST", "REB", "STL", "BLK", "TOV"] if c in df_games.columns]
-    kpis = {f"TOTAL_{c}": float(df_games[c].sum(skipna=True)) for c in kpi_fields}
-    kpis["GAMES_ROWS"] = int(len(df_games))
+    # 3) KPIs da liga — one pc.sum reduction per column, no pandas detour.
+    # Keep the reducer's native int/float instead of boxing everything to
+    # float: integer totals stay exact and JSON carries both fine.
+    kpi_fields = [c for c in ["PTS", "AST", "REB", "STL", "BLK", "TOV"] if c in tbl_games.column_names]
+    kpis = {}
+    for c in kpi_fields:
+        total = pc.sum(tbl_games[c]).as_py()
+        kpis[f"TOTAL_{c}"] = 0 if total is None else total
+    kpis["GAMES_ROWS"] = int(tbl_games.num_rows)
     kpis["ASOF"] = asof
     kpis["SEASON"] = season
-    df_kpis = pd.DataFrame([kpis])
 
     # 4) Standings gold
     df_standings = df_stand.copy()
+    obj_cols = df_standings.select_dtypes(include="object").columns
+    df_standings[obj_cols] = df_standings[obj_cols].astype("category")
     df_standings["ASOF"] = asof
     df_standings["SEASON"] = season
 
     # 5) Write GOLD
-    write_parquet_to_gcs(df_kpis, gold_kpis_gcs, f"nba_gold_kpis_{season}_{asof}.parquet")
-    write_parquet_to_gcs(df_team_totals, gold_team_totals_gcs, f"nba_gold_team_totals_{season}_{asof}.parquet")
-    write_parquet_to_gcs(df_standings, gold_standings_gcs, f"nba_gold_standings_{season}_{asof}.parquet")
+    # KPIs are ~10 scalars: a JSON sidecar avoids parquet footer/schema
+    # overhead and lets the app fetch them with a single small GET.
+    # The parquet pair streams out in parallel on the shared client.
+    upload_json_to_gcs(kpis, gold_kpis_gcs)
+    upload_parquets_to_gcs(
+        {
+            "team_totals.parquet": df_team_totals,
+            "standings.parquet": df_standings,
+        },
+        bucket_name=bucket,
+        blob_prefix=f"gold/season={season}/asof={asof}/",
+    )
 
     print("\n>>> GOLD salvo no GCS:", flush=True)
     print(gold_kpis_gcs, flush=True)
@@ -1,11 +1,31 @@
 # etl/03_backfill_seasons.py
 import argparse
+import importlib.util
 import subprocess
 import sys
 from datetime import date
+from pathlib import Path
 
 CURRENT_SEASON_SAFETY = "2025-26"  # não mexer por padrão
 
+ETL_DIR = Path(__file__).resolve().parent
+
+_STEPS: dict[str, object] = {}
+
+def step(filename: str):
+    """
+    Load an ETL step module once per process (filenames start with digits,
+    so import by path). Running the steps in-process means Python startup,
+    SSL bundle load, pyarrow import and the cached GCS client are paid
+    once for the whole backfill instead of twice per season.
+    """
+    if filename not in _STEPS:
+        spec = importlib.util.spec_from_file_location(Path(filename).stem, ETL_DIR / filename)
+        mod = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(mod)
+        _STEPS[filename] = mod
+    return _STEPS[filename]
+
 def season_str(year_start: int) -> str:
     # 2015 -> "2015-16"
     return f"{year_start}-{str(year_start + 1)[-2:]}"
@@ -21,6 +41,7 @@ def main():
     p.add_argument("--asof", type=str, default=date.today().strftime("%Y-%m-%d"))
     p.add_argument("--bucket", default="nba-data-gustavo")
     p.add_argument("--include_current", action="store_true", help="Se passar, permite rodar também a season atual.")
+    p.add_argument("--isolate", action="store_true", help="Roda cada step em subprocess (debug); default é in-process.")
     args = p.parse_args()
 
     failures = []
@@ -34,16 +55,31 @@ def main():
 
         print(f"\n===== SEASON {season} =====", flush=True)
 
-        rc1 = run([sys.executable, "-u", "etl/01_pull_raw.py",
-                   "--season", season, "--asof", args.asof, "--bucket", args.bucket])
-        if rc1 != 0:
-            failures.append((season, "01_pull_raw", rc1))
+        if args.isolate:
+            rc1 = run([sys.executable, "-u", "etl/01_pull_raw.py",
+                       "--season", season, "--asof", args.asof, "--bucket", args.bucket])
+            if rc1 != 0:
+                failures.append((season, "01_pull_raw", rc1))
+                continue
+
+            rc2 = run([sys.executable, "-u", "etl/02_build_gold.py",
+                       "--season", season, "--asof", args.asof, "--bucket", args.bucket])
+            if rc2 != 0:
+                failures.append((season, "02_build_gold", rc2))
+            continue
+
+        try:
+            step("01_pull_raw.py").main(season=season, asof=args.asof, bucket=args.bucket)
+        except Exception as e:
+            print(f">>> ERROR season={season} 01_pull_raw: {e}", flush=True)
+            failures.append((season, "01_pull_raw", 1))
             continue
 
-        rc2 = run([sys.executable, "-u", "etl/02_build_gold.py",
-                   "--season", season, "--asof", args.asof, "--bucket", args.bucket])
-        if rc2 != 0:
-            failures.append((season, "02_build_gold", rc2))
+        try:
+            step("02_build_gold.py").main(season=season, asof=args.asof, bucket=args.bucket)
+        except Exception as e:
+            print(f">>> ERROR season={season} 02_build_gold: {e}", flush=True)
+            failures.append((season, "02_build_gold", 1))
             continue
 
     print("\n===== DONE =====", flush=True)
@@ -1,55 +1,41 @@
 # etl/04_build_league_season_kpis.py
 print(">>> BOOT 04_build_league_season_kpis.py", flush=True)
 
-import os
-import sys
 import re
-import time
-import threading
-import tempfile
-from pathlib import Path
-from datetime import date
+from concurrent.futures import ThreadPoolExecutor
 
-import faulthandler
 import pandas as pd
-from google.cloud import storage
+import pyarrow as pa
+import pyarrow.compute as pc
+
+import _common
 
 # --------------------------------
 # Debug: dump stacks if hang
 # --------------------------------
-faulthandler.enable()
-
-def dump_later(seconds: int = 120) -> None:
-    time.sleep(seconds)
-    print(f"\n>>> DUMPING STACKS after {seconds}s\n", flush=True)
-    faulthandler.dump_traceback(file=sys.stdout, all_threads=True)
-
 # keep enabled while debugging corporate network hangs
-threading.Thread(target=dump_later, args=(180,), daemon=True).start()
+_common.enable_hang_dump(180)
 
 # --------------------------------
 # SSL corporate bundle (early)
 # --------------------------------
-CA_PATH = Path(__file__).resolve().parents[1] / "certs" / "combined_ca.pem"
-if CA_PATH.exists():
-    os.environ["REQUESTS_CA_BUNDLE"] = str(CA_PATH)
-    os.environ["SSL_CERT_FILE"] = str(CA_PATH)
-    print(f">>> SSL bundle set: {CA_PATH}", flush=True)
-else:
-    print(f">>> WARNING: combined_ca.pem not found at {CA_PATH}", flush=True)
+_common.setup_ssl()
 
 DEFAULT_BUCKET = "nba-data-gustavo"
 
+# Columns the league totals actually consume from RAW leaguegamelog;
+# everything else is pruned at the parquet scan.
+KPI_GAMES_COLS = ["GAME_ID", "PTS", "AST", "REB", "STL", "BLK", "TOV", "FG3M", "FG3A"]
+
+_ASOF_RE = re.compile(r"asof=(\d{4}-\d{2}-\d{2})")
+_GOLD_SEASON_RE = re.compile(r"gold/season=([^/]+)/")
+
 # --------------------------------
 # GCS helpers (robust: explicit download/upload)
 # --------------------------------
-def get_client() -> storage.Client:
-    return storage.Client()
-
 def assert_bucket_access(bucket_name: str) -> None:
     print(f">>> Validating access to bucket objects: {bucket_name}", flush=True)
-    client = get_client()
-    bucket = client.bucket(bucket_name)
+    bucket = _common.get_bucket(bucket_name)
 
     # bucket.exists() requires storage.buckets.get, which may be blocked.
     # Try listing 1 object instead (requires storage.objects.list).
@@ -67,14 +53,9 @@ def list_gold_seasons(bucket_name: str) -> list[str]:
     Discover seasons from gold/season=YYYY-YY/ prefixes.
     (We use gold because you already have backfilled gold for 2020-2025.)
     """
-    client = get_client()
-    bucket = client.bucket(bucket_name)
-
-    it = bucket.list_blobs(prefix="gold/", delimiter="/")
-    _ = list(it)  # populate prefixes
     seasons = []
-    for p in it.prefixes:
-        m = re.search(r"gold/season=([^/]+)/", p)
+    for p in _common.list_prefixes(bucket_name, "gold/"):
+        m = _GOLD_SEASON_RE.search(p)
         if m:
             seasons.append(m.group(1))
     return sorted(seasons)
@@ -84,65 +65,34 @@ def list_raw_asof_dates_for_endpoint(bucket_name: str, season: str, endpoint: st
     Return available ASOF dates for a RAW endpoint (newest first).
     Example:
       raw/season=2025-26/endpoint=leaguegamelog/asof=2026-02-10/data.parquet
-    """
-    client = get_client()
-    bucket = client.bucket(bucket_name)
 
+    Uses a delimiter listing so GCS returns only the asof=... "directory"
+    prefixes instead of every blob under the endpoint.
+    """
     prefix = f"raw/season={season}/endpoint={endpoint}/"
-    blobs = bucket.list_blobs(prefix=prefix)
 
     dates = set()
-    for b in blobs:
-        m = re.search(r"/asof=(\d{4}-\d{2}-\d{2})/", b.name)
+    for p in _common.list_prefixes(bucket_name, prefix):
+        m = _ASOF_RE.search(p)
         if m:
             dates.add(m.group(1))
     return sorted(dates, reverse=True)
 
-def download_blob_to_temp(bucket_name: str, blob_path: str) -> Path:
-    client = get_client()
-    bucket = client.bucket(bucket_name)
-    blob = bucket.blob(blob_path)
-
-    if not blob.exists():
-        raise FileNotFoundError(f"Blob not found: gs://{bucket_name}/{blob_path}")
-
-    tmp_dir = Path(tempfile.gettempdir())
-    local_path = tmp_dir / Path(blob_path).name
-
-    print(f">>> Downloading gs://{bucket_name}/{blob_path} -> {local_path}", flush=True)
-    blob.download_to_filename(str(local_path))
-    return local_path
-
-def read_parquet_gcs(bucket_name: str, blob_path: str) -> pd.DataFrame:
-    local = download_blob_to_temp(bucket_name, blob_path)
-    print(f">>> Reading parquet locally: {local}", flush=True)
-    df = pd.read_parquet(local, engine="pyarrow")
-    try:
-        local.unlink()
-    except Exception:
-        pass
-    return df
-
-def upload_file(bucket_name: str, local_path: Path, blob_path: str) -> None:
-    client = get_client()
-    bucket = client.bucket(bucket_name)
-    blob = bucket.blob(blob_path)
-
-    print(f">>> Uploading {local_path} -> gs://{bucket_name}/{blob_path}", flush=True)
-    blob.upload_from_filename(str(local_path))
-    print(f">>> Uploaded: gs://{bucket_name}/{blob_path}", flush=True)
+def read_parquet_gcs(bucket_name: str, blob_path: str, columns: list[str] | None = None) -> pa.Table:
+    return _common.read_parquet_table(bucket_name, blob_path, columns=columns)
 
 # --------------------------------
 # Aggregation from RAW leaguegamelog
 # --------------------------------
-def compute_league_season_totals_from_leaguegamelog(df_games: pd.DataFrame) -> dict:
+def compute_league_season_totals_from_leaguegamelog(tbl_games: pa.Table) -> dict:
     """
-    df_games is expected at team-game granularity (LeagueGameLog).
+    tbl_games is expected at team-game granularity (LeagueGameLog).
     We'll sum across all rows (teams) for totals,
-    and compute number of unique games by GAME_ID.
+    and compute number of unique games by GAME_ID — all on Arrow's
+    vectorized reducers, no pandas detour per season.
     """
     # Column canonicalization: sometimes the api uses uppercase
-    cols = {c.upper(): c for c in df_games.columns}
+    cols = {c.upper(): c for c in tbl_games.column_names}
 
     def col(name: str) -> str | None:
         return cols.get(name.upper())
@@ -151,12 +101,17 @@ def compute_league_season_totals_from_leaguegamelog(df_games: pd.DataFrame) -> d
         c = col(cname)
         if not c:
             return None
-        return pd.to_numeric(df_games[c], errors="coerce").fillna(0).sum()
+        arr = tbl_games[c]
+        if not (pa.types.is_integer(arr.type) or pa.types.is_floating(arr.type)):
+            arr = pc.cast(arr, pa.float64())
+        total = pc.sum(arr).as_py()
+        return 0 if total is None else total
 
     game_id_col = col("GAME_ID")
     games = None
     if game_id_col:
-        games = int(df_games[game_id_col].astype(str).nunique())
+        # count_distinct works on the native column — no per-row str() pass
+        games = int(pc.count_distinct(tbl_games[game_id_col]).as_py())
 
     totals = {
         "games": games,
@@ -171,35 +126,21 @@ def compute_league_season_totals_from_leaguegamelog(df_games: pd.DataFrame) -> d
     }
     return totals
 
-def add_per_game_metrics(row: dict) -> dict:
-    g = row.get("games")
-    if not g or pd.isna(g) or g == 0:
-        # leave per-game as None
-        row["pts_per_game"] = None
-        row["ast_per_game"] = None
-        row["reb_per_game"] = None
-        row["stl_per_game"] = None
-        row["blk_per_game"] = None
-        row["tov_per_game"] = None
-        row["fg3m_per_game"] = None
-        row["fg3a_per_game"] = None
-        return row
-
-    def per(total_key: str):
-        v = row.get(total_key)
-        if v is None or pd.isna(v):
-            return None
-        return float(v) / float(g)
-
-    row["pts_per_game"] = per("total_pts")
-    row["ast_per_game"] = per("total_ast")
-    row["reb_per_game"] = per("total_reb")
-    row["stl_per_game"] = per("total_stl")
-    row["blk_per_game"] = per("total_blk")
-    row["tov_per_game"] = per("total_tov")
-    row["fg3m_per_game"] = per("total_fg3m")
-    row["fg3a_per_game"] = per("total_fg3a")
-    return row
+def add_per_game_metrics(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Derive the *_per_game columns as one vectorized divide per column
+    (was a per-row dict pass). games==0 maps to NaN so the division
+    propagates missing values naturally.
+    """
+    games = pd.to_numeric(df["games"], errors="coerce").replace(0, float("nan"))
+    for t in [
+        "total_pts", "total_ast", "total_reb", "total_stl",
+        "total_blk", "total_tov", "total_fg3m", "total_fg3a",
+    ]:
+        if t in df.columns:
+            per_col = t.replace("total_", "") + "_per_game"
+            df[per_col] = pd.to_numeric(df[t], errors="coerce") / games
+    return df
 
 def season_in_range(season: str, season_min: str | None, season_max: str | None) -> bool:
     if season_min and season < season_min:
@@ -224,13 +165,12 @@ def main(bucket: str, season_min: str | None, season_max: str | None, endpoint:
     rows = []
     errors = []
 
+    # Choose ASOF per season up front:
+    # - if user passed --asof, use it
+    # - else pick latest available in raw for this endpoint
+    targets = []
     for s in seasons:
-        print(f"\n>>> Processing season={s}", flush=True)
-
         try:
-            # Choose ASOF:
-            # - if user passed --asof, use it
-            # - else pick latest available in raw for this endpoint
             if asof:
                 chosen_asof = asof
             else:
@@ -240,27 +180,46 @@ def main(bucket: str, season_min: str | None, season_max: str | None, endpoint:
                 chosen_asof = asofs[0]
 
             blob_path = f"raw/season={s}/endpoint={endpoint}/asof={chosen_asof}/data.parquet"
+            targets.append((s, chosen_asof, blob_path))
+        except Exception as e:
+            print(f">>> ERROR season={s}: {e}", flush=True)
+            errors.append((s, str(e)))
 
-            df_games = read_parquet_gcs(bucket, blob_path)
-            print(f">>> RAW {endpoint} rows={len(df_games)} cols={df_games.shape[1]} asof={chosen_asof}", flush=True)
+    # Prefetch the season parquets on a small pool so the downloads
+    # overlap with each other and with the aggregation of earlier
+    # seasons; the loop is bounded by max(download, compute) not the sum.
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        futures = {
+            s: ex.submit(read_parquet_gcs, bucket, blob_path, KPI_GAMES_COLS)
+            for s, _, blob_path in targets
+        }
 
-            totals = compute_league_season_totals_from_leaguegamelog(df_games)
-            row = {"season": s, "asof": chosen_asof}
-            row.update(totals)
-            row = add_per_game_metrics(row)
+        for s, chosen_asof, blob_path in targets:
+            print(f"\n>>> Processing season={s}", flush=True)
 
-            print(
-                f">>> OK season={s} games={row.get('games')} PTS={row.get('total_pts')} "
-                f"FG3M={row.get('total_fg3m')} FG3A={row.get('total_fg3a')}",
-                flush=True
-            )
+            try:
+                tbl_games = futures[s].result()
+                print(f">>> RAW {endpoint} rows={tbl_games.num_rows} cols={tbl_games.num_columns} asof={chosen_asof}", flush=True)
 
-            rows.append(row)
+                if tbl_games.num_rows == 0:
+                    raise ValueError(f"RAW snapshot is empty: {blob_path}")
 
-        except Exception as e:
-            print(f">>> ERROR season={s}: {e}", flush=True)
-            errors.append((s, str(e)))
-            continue
+                totals = compute_league_season_totals_from_leaguegamelog(tbl_games)
+                row = {"season": s, "asof": chosen_asof}
+                row.update(totals)
+
+                print(
+                    f">>> OK season={s} games={row.get('games')} PTS={row.get('total_pts')} "
+                    f"FG3M={row.get('total_fg3m')} FG3A={row.get('total_fg3a')}",
+                    flush=True
+                )
+
+                rows.append(row)
+
+            except Exception as e:
+                print(f">>> ERROR season={s}: {e}", flush=True)
+                errors.append((s, str(e)))
+                continue
 
     if not rows:
         raise RuntimeError("No rows produced. Check errors above and bucket contents.")
@@ -277,19 +236,12 @@ def main(bucket: str, season_min: str | None, season_max: str | None, endpoint:
         if c in df.columns:
             df[c] = pd.to_numeric(df[c], errors="coerce")
 
-    df = df.sort_values("season").reset_index(drop=True)
+    df = add_per_game_metrics(df)
 
-    out_local = Path(tempfile.gettempdir()) / "league_season_kpis.parquet"
-    print(f"\n>>> Writing output parquet locally: {out_local}", flush=True)
-    df.to_parquet(out_local, index=False, engine="pyarrow")
+    df = df.sort_values("season").reset_index(drop=True)
 
     out_blob = "gold/league_season_kpis.parquet"
-    upload_file(bucket, out_local, out_blob)
-
-    try:
-        out_local.unlink()
-    except Exception:
-        pass
+    _common.write_parquet(df, bucket, out_blob)
 
     print(f"\n✅ DONE: gs://{bucket}/{out_blob}", flush=True)
     print(f">>> seasons_written={len(df)} cols={df.shape[1]}", flush=True)
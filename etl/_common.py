@@ -0,0 +1,114 @@
+# etl/_common.py
+"""
+Shared GCS / SSL / debug plumbing for the ETL scripts.
+
+The steps run as `python etl/XX_....py`, which puts etl/ on sys.path, so
+a plain `import _common` resolves from every script — including when
+03_backfill_seasons loads the steps by path for the in-process loop.
+Keeping the client cache and the streaming readers/writers here means a
+perf fix lands once instead of once per script.
+"""
+import io
+import os
+import sys
+import faulthandler
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from google.cloud import storage
+
+
+def enable_hang_dump(seconds: int = 60) -> None:
+    # watchdog inside the interpreter — no Python thread slot held
+    faulthandler.enable()
+    faulthandler.dump_traceback_later(seconds, repeat=False, file=sys.stdout)
+
+
+def setup_ssl() -> None:
+    # corporate bundle — must be set before any HTTPS client is created
+    ca_path = Path(__file__).resolve().parents[1] / "certs" / "combined_ca.pem"
+    if ca_path.exists():
+        os.environ["REQUESTS_CA_BUNDLE"] = str(ca_path)
+        os.environ["SSL_CERT_FILE"] = str(ca_path)
+        print(f">>> SSL bundle set: {ca_path}", flush=True)
+    else:
+        print(f">>> WARNING: combined_ca.pem not found at {ca_path}", flush=True)
+
+
+_CLIENT: storage.Client | None = None
+_BUCKETS: dict[str, storage.Bucket] = {}
+
+
+def get_client() -> storage.Client:
+    # one client per process: auth + HTTP pool setup costs ~100-300 ms,
+    # and a shared client reuses TLS sessions across all blob operations
+    global _CLIENT
+    if _CLIENT is None:
+        _CLIENT = storage.Client()
+    return _CLIENT
+
+
+def get_bucket(bucket_name: str) -> storage.Bucket:
+    if bucket_name not in _BUCKETS:
+        _BUCKETS[bucket_name] = get_client().bucket(bucket_name)
+    return _BUCKETS[bucket_name]
+
+
+def parse_gs_uri(gs_uri: str) -> tuple[str, str]:
+    if not gs_uri.startswith("gs://"):
+        raise ValueError(f"Invalid GCS URI: {gs_uri}")
+    parts = gs_uri.split("/", 3)  # ["gs:", "", "bucket", "path..."]
+    bucket_name = parts[2]
+    blob_path = parts[3] if len(parts) > 3 else ""
+    return bucket_name, blob_path
+
+
+def read_parquet_table(bucket_name: str, blob_path: str, columns: list[str] | None = None) -> pa.Table:
+    # Stream into memory and decode with pyarrow directly — no temp-file
+    # round-trip, and the explicit client download still works behind the
+    # corporate proxy (unlike gs:// filesystem readers).
+    # `columns` prunes the read; matching is case-insensitive since older
+    # snapshots vary in header casing, and missing names are skipped.
+    blob = get_bucket(bucket_name).blob(blob_path)
+
+    print(f">>> Streaming gs://{bucket_name}/{blob_path}", flush=True)
+    buf = io.BytesIO()
+    blob.download_to_file(buf)
+    buf.seek(0)
+
+    pf = pq.ParquetFile(buf)
+    cols = None
+    if columns:
+        by_upper = {n.upper(): n for n in pf.schema_arrow.names}
+        cols = [by_upper[c.upper()] for c in columns if c.upper() in by_upper] or None
+
+    return pf.read(columns=cols)
+
+
+def write_parquet(data: pd.DataFrame | pa.Table, bucket_name: str, blob_path: str, **parquet_kwargs) -> None:
+    # Stream the parquet bytes straight into the blob — no temp file on
+    # disk and no second pass re-reading it for upload.
+    blob = get_bucket(bucket_name).blob(blob_path)
+
+    print(f">>> Streaming parquet to gs://{bucket_name}/{blob_path}", flush=True)
+    table = data if isinstance(data, pa.Table) else pa.Table.from_pandas(data, preserve_index=False)
+    kwargs = {"compression": "zstd", "compression_level": 3}
+    kwargs.update(parquet_kwargs)
+    with blob.open("wb") as sink:
+        pq.write_table(table, sink, **kwargs)
+    print(f">>> Uploaded: gs://{bucket_name}/{blob_path}", flush=True)
+
+
+def list_prefixes(bucket_name: str, prefix: str) -> list[str]:
+    # Delimiter listing restricted to fields="prefixes,..." returns only
+    # the "directory" names, never the object metadata underneath.
+    it = get_bucket(bucket_name).list_blobs(
+        prefix=prefix, delimiter="/", page_size=1000,
+        fields="prefixes,nextPageToken",
+    )
+    prefixes: list[str] = []
+    for page in it.pages:
+        prefixes.extend(page.prefixes)
+    return prefixes